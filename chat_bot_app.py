@@ -7,21 +7,38 @@ an iframe (see canvas doc *Gradientm Chatbot Integration Update*).
 
 from __future__ import annotations
 
+import hashlib
 import os
 import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import Any, Deque, Dict, Iterator, List
+from uuid import uuid4
 
+import diskcache
+import httpx
+import numpy as np
+import orjson
 from dotenv import load_dotenv
 from flask import (
     Flask,
+    Response,
     request,
-    render_template_string,
-    send_from_directory,
     redirect,
+    session,
+    stream_with_context,
     url_for,
 )
-from openai import AzureOpenAI
+from flask.json.provider import DefaultJSONProvider, JSONProvider
+from flask_compress import Compress
+from markupsafe import Markup, escape
+from openai import NOT_GIVEN, AzureOpenAI
+from whitenoise import WhiteNoise
 
 # ---------------------------------------------------------------------------
 #  Configuration & Azure clients
@@ -46,105 +63,660 @@ if not AZURE_OPENAI_API_KEY:
 if not AZURE_SEARCH_KEY:
     raise EnvironmentError("SEARCH_KEY is required but not set.")
 
+# --- Optional environment variables ---------------------------------------
+# Embedding deployment used by the semantic response cache (disabled if unset)
+AZURE_OPENAI_EMBEDDING_DEPLOYMENT: str | None = os.getenv(
+    "EMBEDDING_DEPLOYMENT_NAME"
+)
+# Send `prompt_cache_key` with completions (only for API versions accepting it)
+AZURE_OPENAI_PROMPT_CACHE_KEY: bool = os.getenv("USE_PROMPT_CACHE_KEY") == "1"
+
 # --- Flask app -------------------------------------------------------------
-app = Flask(__name__, static_folder=".", static_url_path="")
+class OrjsonProvider(JSONProvider):
+    """Flask JSON provider backed by orjson (also used for the session cookie).
+
+    Output matches `DefaultJSONProvider`: keys are sorted, and datetimes and
+    dataclasses are passed to its `default` (HTTP dates, `asdict`) instead
+    of orjson's native encoding.
+    """
+
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_SORT_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME
+        | orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return orjson.dumps(
+            obj, default=DefaultJSONProvider.default, option=self.options
+        ).decode()
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+
+# No Flask static route: the public site is served by WhiteNoise below.
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.getenv("FLASK_SECRET", "change-this-secret")
+app.json = OrjsonProvider(app)
+
+# Brotli/gzip for the dynamic chat page. Streamed replies are left
+# uncompressed, otherwise the compressor would buffer tokens.
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_STREAMS"] = False
+Compress(app)
+
+
+# The public website (index.html at `/` plus its assets) is served by
+# WhiteNoise straight from the WSGI layer: files are indexed once at start-up
+# with precomputed headers, so they never reach a Flask view. Only the site
+# itself is registered – never the source, dotfiles or VCS metadata.
+SITE_ROOT = app.root_path
+SITE_DIRECTORIES = ("assets", "include")
+
+
+def add_site_headers(headers, path: str, url: str) -> None:
+    """Same-origin framing only, as `allow_iframe` does for Flask responses."""
+    headers["X-Frame-Options"] = "SAMEORIGIN"
+
+
+site_files = WhiteNoise(
+    app.wsgi_app,
+    autorefresh=False,
+    max_age=60 * 60,  # Cache-Control for the site, in seconds
+    add_headers_function=add_site_headers,
+)
+for directory in SITE_DIRECTORIES:
+    site_files.add_files(os.path.join(SITE_ROOT, directory), prefix=directory)
+for name in os.listdir(SITE_ROOT):
+    if name.endswith(".html"):
+        site_files.add_file_to_dictionary(f"/{name}", os.path.join(SITE_ROOT, name))
+site_files.add_file_to_dictionary("/", os.path.join(SITE_ROOT, "index.html"))
+app.wsgi_app = site_files
 
 # --- Azure OpenAI client (key‑based auth) ----------------------------------
+# One keep-alive HTTP/2 connection pool shared by every chat turn, so
+# consecutive requests reuse the TLS session to Azure.
+http_client = httpx.Client(
+    http2=True,
+    limits=httpx.Limits(max_keepalive_connections=20, keepalive_expiry=60),
+)
+
 client = AzureOpenAI(
     azure_endpoint=AZURE_OPENAI_ENDPOINT,
     api_key=AZURE_OPENAI_API_KEY,
     api_version="2025-01-01-preview",
+    http_client=http_client,
 )
 
 # ---------------------------------------------------------------------------
 #  Helper utilities
 # ---------------------------------------------------------------------------
 
+_time_cache: tuple[int, str] = (-1, "")  # (minute since epoch, formatted)
+
+
 def current_time() -> str:
-    """Current local time formatted nicely (e.g. '10:05 AM')."""
-    return datetime.now().strftime("%I:%M %p")
+    """Current local time formatted nicely (e.g. '10:05 AM').
+
+    The text only changes once a minute, so it is formatted once per minute.
+    """
+    global _time_cache
+    minute = int(time.time() // 60)
+    if _time_cache[0] != minute:
+        formatted = datetime.fromtimestamp(minute * 60).strftime("%I:%M %p")
+        _time_cache = (minute, formatted)
+    return _time_cache[1]
+
+
+_DOC_RE = re.compile(r"\[doc\d+\]")
 
 
 def clean_response(text: str) -> str:
     """Remove citation tokens like `[doc1]` and tidy whitespace/punctuation."""
-    text = re.sub(r"\[doc\d+\]", "", text)
-    text = re.sub(r"\s+\.", ".", text)
-    return re.sub(r"\s+", " ", text).strip()
+    if "[doc" in text:
+        text = _DOC_RE.sub("", text)
+    # split()/join() collapses whitespace runs and trims both ends in one C
+    # pass; a space left in front of a full stop is then dropped.
+    return " ".join(text.split()).replace(" .", ".")
+
+
+class ReplyCleaner:
+    """Apply `clean_response` to a reply that arrives in pieces.
+
+    Raw text is cleaned one whitespace-delimited word at a time, as soon as
+    the whitespace after the word has arrived, so every character is cleaned
+    once. Citation tokens contain no whitespace, so later pieces cannot
+    change a finished word, and the concatenated output of `feed` and
+    `finish` equals `clean_response` of the whole text.
+    """
+
+    __slots__ = ("_tail", "_started")
+
+    def __init__(self) -> None:
+        self._tail = ""  # raw text after the last whitespace seen
+        self._started = False  # whether a word has been emitted yet
+
+    def feed(self, text: str) -> str:
+        """Add raw text; return the cleaned text it completes (may be empty)."""
+        index = len(text) - 1
+        while index >= 0 and not text[index].isspace():
+            index -= 1
+        if index < 0:
+            self._tail += text
+            return ""
+        complete = self._tail + text[:index]
+        self._tail = text[index + 1 :]
+        return self._words(complete)
+
+    def finish(self) -> str:
+        """Return the cleaned text of the last, unterminated word."""
+        tail, self._tail = self._tail, ""
+        return self._words(tail)
+
+    def _words(self, text: str) -> str:
+        if "[doc" in text:
+            text = _DOC_RE.sub("", text)
+        parts = []
+        for word in text.split():
+            # Same result as clean_response's join + replace(" .", ".").
+            if self._started and not word.startswith("."):
+                parts.append(" ")
+            parts.append(word)
+            self._started = True
+        return "".join(parts)
+
+
+def normalize_prompt(text: str) -> str:
+    """Case- and whitespace-insensitive form of a user prompt."""
+    return " ".join(text.split()).lower()
+
+
+_GREETING_RE = re.compile(
+    r"(?i)\s*(?:hi|hello|hey|thanks|thank you|bye)(?:\s+there)?[\s!.,?]*"
+)
+
+
+def is_small_talk(text: str) -> bool:
+    """True for a bare greeting/thanks (nothing else) needing no retrieval."""
+    return _GREETING_RE.fullmatch(text) is not None
 
 
 # ---------------------------------------------------------------------------
 #  Conversation state (kept in memory – fine for small deployments)
 # ---------------------------------------------------------------------------
 
-conversation_history: List[Dict[str, Any]] = [
-    {
-        "role": "assistant",
-        "content": "Hello! How can I assist you today?",
-        "timestamp": current_time(),
-    }
-]
+GREETING = "Hello! How can I assist you today?"
+
+HISTORY_MAX_MESSAGES = 20  # most recent messages kept verbatim
+SUMMARY_BATCH = 10  # evicted messages folded into the summary at a time
+MAX_SESSIONS = 1000  # conversations kept before the least recent is dropped
+
+
+@dataclass(slots=True, frozen=True)
+class ChatMessage:
+    """A message as shown in the chat window.
+
+    `content_html` is escaped once when the message is recorded, so
+    rendering the page does not re-escape the whole history.
+    """
+
+    role: str
+    content: str
+    content_html: Markup
+    timestamp: str
+
+
+class Conversation:
+    """One visitor's chat: the recent window, model payload and summary.
+
+    `lock` serialises turns of the same conversation; different visitors
+    are served in parallel.
+    """
+
+    def __init__(self, session_id: str) -> None:
+        # Stable per-visitor id sent to Azure so a conversation keeps hitting
+        # a backend with its prompt prefix cached; hashed, so the session id
+        # itself never leaves the app.
+        self.user_id = hashlib.blake2b(session_id.encode(), digest_size=16).hexdigest()
+        self.history: Deque[ChatMessage] = deque(maxlen=HISTORY_MAX_MESSAGES)
+        # Model payload kept in step with `history` (without timestamps), so
+        # each turn appends to it instead of rebuilding it.
+        self.api_messages: Deque[Dict[str, str]] = deque(
+            maxlen=HISTORY_MAX_MESSAGES
+        )
+        # Older turns: messages pushed out of the window and not yet
+        # summarised, and a rolling summary of everything before them.
+        self.evicted: List[Dict[str, str]] = []
+        self.summary = ""
+        self.summarizing = False
+        self.lock = threading.Lock()
+        self.version = 0  # bumped on every change; keys the rendered page
+        self.rendered: tuple[int, str] | None = None
+        self.record("assistant", GREETING)
+
+    def record(self, role: str, content: str) -> None:
+        """Append a message to the conversation and to the model payload.
+
+        Once the window is full the oldest message is evicted; see
+        `summarize_evicted` for how evictions are folded into the summary.
+        """
+        if len(self.api_messages) == self.api_messages.maxlen:
+            self.evicted.append(self.api_messages[0])
+        self.history.append(
+            ChatMessage(role, content, escape(content), current_time())
+        )
+        self.api_messages.append({"role": role, "content": content})
+        self.version += 1
+
+    def summarize_evicted(self) -> None:
+        """Fold evicted messages into the rolling summary, best effort.
+
+        Runs once `SUMMARY_BATCH` messages have been evicted, so the prompt
+        sent to the model stays bounded however long the chat runs. The
+        model call is made outside `lock`; if it fails the evicted messages
+        are kept (and still sent verbatim) and the next turn retries.
+        """
+        with self.lock:
+            if self.summarizing or len(self.evicted) < SUMMARY_BATCH:
+                return
+            self.summarizing = True
+            summary, batch = self.summary, list(self.evicted)
+        try:
+            new_summary = summarize(summary, batch)
+        except Exception:
+            app.logger.exception("Conversation summary failed; will retry")
+            new_summary = None
+        with self.lock:
+            self.summarizing = False
+            if new_summary is not None:
+                self.summary = new_summary
+                del self.evicted[: len(batch)]  # later evictions are appended
+
+    def payload(self) -> List[Dict[str, str]]:
+        """Messages for the model: summary, unsummarised evictions, recent window."""
+        payload: List[Dict[str, str]] = []
+        if self.summary:
+            payload.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of the earlier conversation: {self.summary}",
+                }
+            )
+        payload.extend(self.evicted)
+        payload.extend(self.api_messages)
+        return payload
+
+
+_sessions: OrderedDict[str, Conversation] = OrderedDict()
+_sessions_lock = threading.Lock()
+
+
+def get_conversation(session_id: str) -> Conversation:
+    """Conversation for *session_id*, created on first use (LRU-bounded)."""
+    with _sessions_lock:
+        conversation = _sessions.get(session_id)
+        if conversation is None:
+            conversation = _sessions[session_id] = Conversation(session_id)
+            if len(_sessions) > MAX_SESSIONS:
+                _sessions.popitem(last=False)
+        else:
+            _sessions.move_to_end(session_id)
+        return conversation
+
+
+def drop_conversation(session_id: str) -> None:
+    """Forget the conversation for *session_id* (next request starts afresh)."""
+    with _sessions_lock:
+        _sessions.pop(session_id, None)
 
 
 # ---------------------------------------------------------------------------
-#  Chatbot logic – call Azure OpenAI w/ Azure Search grounding
+#  Exact-match response cache – persisted on disk across restarts
 # ---------------------------------------------------------------------------
 
-def get_chatbot_response(user_message: str) -> str:
-    """Append user message, query Azure OpenAI, store and return assistant reply."""
+# Kept outside the app directory, which is served as static files.
+RESPONSE_CACHE_DIR = os.getenv(
+    "RESPONSE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "gradientm-chatbot"),
+)
+RESPONSE_CACHE_TTL = 24 * 60 * 60  # seconds
+RESPONSE_CACHE_SIZE_LIMIT = 2**30  # bytes
+
+response_cache = diskcache.Cache(
+    RESPONSE_CACHE_DIR, size_limit=RESPONSE_CACHE_SIZE_LIMIT
+)
+# Reopened lazily on first use, so no SQLite handle is inherited across fork.
+response_cache.close()
+
+
+def response_cache_key(user_message: str) -> str:
+    """Cache key for *user_message*, insensitive to case and spacing."""
+    normalized = normalize_prompt(user_message)
+    return hashlib.blake2b(normalized.encode(), digest_size=16).hexdigest()
 
-    conversation_history.append(
-        {"role": "user", "content": user_message, "timestamp": current_time()}
+
+# ---------------------------------------------------------------------------
+#  Semantic response cache – skip the model for near-duplicate questions
+# ---------------------------------------------------------------------------
+
+SEMANTIC_CACHE_THRESHOLD = 0.9  # cosine similarity needed for a cache hit
+SEMANTIC_CACHE_MAX_ENTRIES = 512
+
+
+class SemanticCache:
+    """Bounded LRU store of replies keyed by unit-normalised prompt embeddings.
+
+    Lookups are a single matrix-vector product over all stored embeddings
+    (an exact inner-product search), which is plenty for a few hundred FAQ
+    style prompts.
+    """
+
+    def __init__(self, threshold: float, max_entries: int) -> None:
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._vectors: np.ndarray | None = None  # allocated on first insert
+        self._replies: List[str | None] = [None] * max_entries
+        self._last_used = np.zeros(max_entries, dtype=np.int64)
+        self._size = 0
+        self._clock = 0
+        self._lock = threading.Lock()
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get(self, vector: np.ndarray) -> str | None:
+        """Return the reply stored for the most similar prompt, if close enough."""
+        with self._lock:
+            if not self._size:
+                return None
+            scores = self._vectors[: self._size] @ vector
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                return None
+            self._last_used[best] = self._tick()
+            return self._replies[best]
+
+    def put(self, vector: np.ndarray, reply: str) -> None:
+        """Store *reply* for *vector*, evicting the least recently used entry."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros(
+                    (self.max_entries, vector.shape[0]), dtype=np.float32
+                )
+            if self._size < self.max_entries:
+                slot = self._size
+                self._size += 1
+            else:
+                slot = int(np.argmin(self._last_used))
+            self._vectors[slot] = vector
+            self._replies[slot] = reply
+            self._last_used[slot] = self._tick()
+
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES)
+
+
+def embed(text: str) -> np.ndarray:
+    """Unit-normalised embedding of *text* from the embedding deployment."""
+    response = client.embeddings.create(
+        model=AZURE_OPENAI_EMBEDDING_DEPLOYMENT, input=text
     )
+    vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
 
-    # Strip timestamps for model call
-    messages_for_api = [
-        {"role": m["role"], "content": m["content"]} for m in conversation_history
-    ]
 
-    response = client.chat.completions.create(
+# ---------------------------------------------------------------------------
+#  Chatbot logic – call Azure OpenAI w/ Azure Search grounding
+# ---------------------------------------------------------------------------
+
+# Azure Search grounding sent with every completion – static, so built once.
+_DATA_SOURCES: List[Dict[str, Any]] = [
+    {
+        "type": "azure_search",
+        "parameters": {
+            "endpoint": AZURE_SEARCH_ENDPOINT,
+            "index_name": AZURE_SEARCH_INDEX,
+            "semantic_configuration": "default",
+            "query_type": "simple",
+            "fields_mapping": {},
+            "in_scope": True,
+            "filter": None,
+            "strictness": 3,
+            "top_n_documents": 3,
+            "authentication": {
+                "type": "api_key",
+                "key": AZURE_SEARCH_KEY,
+            },
+        },
+    }
+]
+_EXTRA_BODY: Dict[str, Any] = {"data_sources": _DATA_SOURCES}
+
+MAX_TOKENS_SHORT = 350
+MAX_TOKENS_LONG = 800
+_LONG_ANSWER_HINTS = ("explain", "detail", "list")
+
+
+def reply_token_budget(user_message: str) -> int:
+    """Completion token cap: short answers unless the question asks for more."""
+    lowered = user_message.lower()
+    if len(user_message) > 200 or any(hint in lowered for hint in _LONG_ANSWER_HINTS):
+        return MAX_TOKENS_LONG
+    return MAX_TOKENS_SHORT
+
+
+def stream_completion(
+    messages_for_api: List[Dict[str, str]],
+    max_tokens: int,
+    grounded: bool = True,
+    user_id: str | None = None,
+) -> Iterator[str]:
+    """Stream cleaned reply fragments from Azure OpenAI.
+
+    Returns the full reply and the stream's finish reason (`"length"` when
+    the reply was cut off at `max_tokens`).
+
+    With `grounded=False` the Azure Search data source is left out, which
+    skips retrieval for messages that do not need it. `user_id` identifies
+    the conversation to Azure for prompt-cache routing.
+    """
+
+    extra_body: Dict[str, Any] | None = _EXTRA_BODY if grounded else None
+    if user_id and AZURE_OPENAI_PROMPT_CACHE_KEY:
+        extra_body = {**(extra_body or {}), "prompt_cache_key": user_id}
+
+    stream = client.chat.completions.create(
         model=AZURE_OPENAI_DEPLOYMENT,
         messages=messages_for_api,
-        max_tokens=800,
+        max_tokens=max_tokens,
         temperature=0.7,
         top_p=0.95,
         frequency_penalty=0.0,
         presence_penalty=0.0,
-        extra_body={
-            "data_sources": [
-                {
-                    "type": "azure_search",
-                    "parameters": {
-                        "endpoint": AZURE_SEARCH_ENDPOINT,
-                        "index_name": AZURE_SEARCH_INDEX,
-                        "semantic_configuration": "default",
-                        "query_type": "simple",
-                        "fields_mapping": {},
-                        "in_scope": True,
-                        "filter": None,
-                        "strictness": 3,
-                        "top_n_documents": 5,
-                        "authentication": {
-                            "type": "api_key",
-                            "key": AZURE_SEARCH_KEY,
-                        },
-                    },
-                }
-            ]
-        },
+        stream=True,
+        user=user_id or NOT_GIVEN,
+        extra_body=extra_body,
     )
 
-    assistant_reply: str = clean_response(response.choices[0].message.content)
-
-    conversation_history.append(
-        {
-            "role": "assistant",
-            "content": assistant_reply,
-            "timestamp": current_time(),
+    cleaner = ReplyCleaner()
+    fragments: List[str] = []
+    finish_reason = None
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        choice = chunk.choices[0]
+        finish_reason = choice.finish_reason or finish_reason
+        if not choice.delta.content:
+            continue
+        fragment = cleaner.feed(choice.delta.content)
+        if fragment:
+            fragments.append(fragment)
+            yield fragment
+
+    fragment = cleaner.finish()
+    if fragment:
+        fragments.append(fragment)
+        yield fragment
+    return "".join(fragments), finish_reason
+
+
+# Replies currently being generated for opening questions, keyed by the
+# normalised prompt, so identical concurrent questions share one model call.
+_inflight: Dict[str, Future] = {}
+# The leader generates only as fast as its own client reads the stream, so
+# waiters give up after this many seconds and make their own call.
+COALESCE_WAIT_SECONDS = 10
+_inflight_lock = threading.Lock()
+
+
+def stream_coalesced(
+    user_message: str, messages_for_api: List[Dict[str, str]], **options: Any
+) -> Iterator[str]:
+    """Like `stream_completion`, but wait for an identical in-flight prompt.
+
+    The first caller for a prompt streams from the model; concurrent callers
+    with the same prompt receive the finished reply in one piece. If the
+    first call fails or takes longer than `COALESCE_WAIT_SECONDS`, waiters
+    make their own call.
+    """
+    key = normalize_prompt(user_message)
+    with _inflight_lock:
+        pending = _inflight.get(key)
+        leader = pending is None
+        if leader:
+            pending = _inflight[key] = Future()
+
+    if not leader:
+        try:
+            result = pending.result(timeout=COALESCE_WAIT_SECONDS)
+        except FutureTimeoutError:
+            result = None
+        if result is None:
+            return (yield from stream_completion(messages_for_api, **options))
+        yield result[0]
+        return result
+
+    result = None
+    try:
+        result = yield from stream_completion(messages_for_api, **options)
+        return result
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        pending.set_result(result)
+
+
+def stream_chatbot_response(
+    conversation: Conversation, user_message: str
+) -> Iterator[str]:
+    """Stream the assistant reply to a user message from Azure OpenAI.
+
+    Yields cleaned text fragments as the model produces them. The question
+    and the complete reply are stored in the conversation together once the
+    stream is exhausted, so a failed or abandoned stream leaves no
+    unanswered question behind.
+    """
+    with conversation.lock:
+        # Only the opening question is independent of earlier turns, so only
+        # that one may be answered from (or stored in) the response caches or
+        # share a model call with other visitors. Ungrounded small-talk
+        # replies are never shared through the caches.
+        opening = len(conversation.history) == 1
+        grounded = not is_small_talk(user_message)
+        cacheable = opening and grounded
+        cache_key = None
+        query_vector = None
+        cached_reply = None
+        if cacheable:
+            cache_key = response_cache_key(user_message)
+            cached_reply = response_cache.get(cache_key)
+        if cached_reply is None and AZURE_OPENAI_EMBEDDING_DEPLOYMENT and cacheable:
+            try:
+                query_vector = embed(user_message)
+            except Exception:
+                # The semantic cache is an optimisation; answer without it.
+                app.logger.exception("Embedding failed; skipping semantic cache")
+            else:
+                cached_reply = semantic_cache.get(query_vector)
+
+        if cached_reply is not None:
+            conversation.record("user", user_message)
+            conversation.record("assistant", cached_reply)
+            summarize_in_background(conversation)
+            yield cached_reply
+            return
+
+        messages_for_api = conversation.payload()
+        messages_for_api.append({"role": "user", "content": user_message})
+        options = {
+            "max_tokens": reply_token_budget(user_message),
+            "grounded": grounded,
+            "user_id": conversation.user_id,
         }
+        if opening:
+            assistant_reply, finish_reason = yield from stream_coalesced(
+                user_message, messages_for_api, **options
+            )
+        else:
+            assistant_reply, finish_reason = yield from stream_completion(
+                messages_for_api, **options
+            )
+
+        # Empty or truncated replies are answered once, never served again.
+        if assistant_reply and finish_reason != "length":
+            if cache_key is not None:
+                response_cache.set(
+                    cache_key, assistant_reply, expire=RESPONSE_CACHE_TTL
+                )
+            if query_vector is not None:
+                semantic_cache.put(query_vector, assistant_reply)
+
+        conversation.record("user", user_message)
+        conversation.record("assistant", assistant_reply)
+        summarize_in_background(conversation)
+
+
+def summarize(summary: str, messages: List[Dict[str, str]]) -> str:
+    """Fold *messages* into the running conversation *summary*."""
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    response = client.chat.completions.create(
+        model=AZURE_OPENAI_DEPLOYMENT,
+        messages=[
+            {
+                "role": "system",
+                "content": (
+                    "Condense the conversation into a brief summary that keeps "
+                    "the facts, names and open questions needed to continue it."
+                ),
+            },
+            {
+                "role": "user",
+                "content": f"Summary so far:\n{summary or '(none)'}\n\n"
+                f"New messages:\n{transcript}",
+            },
+        ],
+        max_tokens=200,
+        temperature=0.3,
     )
+    return response.choices[0].message.content.strip()
 
-    return assistant_reply
+
+def summarize_in_background(conversation: Conversation) -> None:
+    """Start `Conversation.summarize_evicted` off the request path if due.
+
+    The thread waits for the current turn to release the conversation lock,
+    so the summary never delays or breaks the reply being streamed.
+    """
+    if len(conversation.evicted) >= SUMMARY_BATCH and not conversation.summarizing:
+        threading.Thread(target=conversation.summarize_evicted, daemon=True).start()
+
+
+def get_chatbot_response(conversation: Conversation, user_message: str) -> str:
+    """Append user message, query Azure OpenAI, store and return assistant reply."""
+    return "".join(stream_chatbot_response(conversation, user_message))
 
 
 # ---------------------------------------------------------------------------
@@ -187,54 +759,135 @@ CHATBOT_TEMPLATE = """
   <div class=\"chat-container\">
     <div class=\"chat-header\">Gradient M Chatbot <a href=\"/reset\">Clear</a></div>
     <div id=\"loader\" class=\"loading-indicator\"></div>
-    <div class=\"chat-messages\">
+    <div id=\"messages\" class=\"chat-messages\">
       {% for msg in conversation %}
         <div class=\"message {{ msg.role }}\">
-          <div class=\"bubble\">{{ msg.content }}</div>
+          <div class=\"bubble\">{{ msg.content_html }}</div>
           <div class=\"timestamp\">{{ msg.timestamp }}</div>
         </div>
       {% endfor %}
     </div>
-    <form class=\"chat-input\" action=\"/chat\" method=\"post\" onsubmit=\"document.getElementById('loader').style.display='block';\">
+    <form id=\"chat-form\" class=\"chat-input\" action=\"/chat\" method=\"post\" onsubmit=\"document.getElementById('loader').style.display='block';\">
       <input type=\"text\" name=\"question\" placeholder=\"Type your question…\" required autofocus>
       <button type=\"submit\">Send</button>
     </form>
   </div>
+  <script>
+    // Stream the reply into the page when fetch streaming is available;
+    // otherwise the form falls back to a regular POST + redirect.
+    (function () {
+      var form = document.getElementById('chat-form');
+      var list = document.getElementById('messages');
+      if (!window.fetch || !window.ReadableStream || !window.TextDecoder) return;
+      function bubble(role, text, time) {
+        var msg = document.createElement('div');
+        msg.className = 'message ' + role;
+        var body = document.createElement('div');
+        body.className = 'bubble';
+        body.textContent = text;
+        var stamp = document.createElement('div');
+        stamp.className = 'timestamp';
+        stamp.textContent = time;
+        msg.appendChild(body);
+        msg.appendChild(stamp);
+        list.appendChild(msg);
+        list.scrollTop = list.scrollHeight;
+        return {body: body, stamp: stamp};
+      }
+      form.addEventListener('submit', async function (event) {
+        event.preventDefault();
+        var data = new FormData(form);
+        var input = form.elements.question;
+        var button = form.querySelector('button');
+        var question = input.value.trim();
+        if (!question) return;
+        input.value = '';
+        input.disabled = button.disabled = true;
+        var mine = bubble('user', question, '');
+        var reply = bubble('assistant', '', '');
+        try {
+          var resp = await fetch('/chat/stream', {method: 'POST', body: data});
+          if (!resp.ok) throw new Error(resp.status);
+          var time = resp.headers.get('X-Chat-Time') || '';
+          mine.stamp.textContent = reply.stamp.textContent = time;
+          var reader = resp.body.getReader();
+          var decoder = new TextDecoder();
+          for (;;) {
+            var part = await reader.read();
+            if (part.done) break;
+            reply.body.textContent += decoder.decode(part.value, {stream: true});
+            list.scrollTop = list.scrollHeight;
+          }
+        } catch (err) {
+          reply.body.textContent = 'Sorry, something went wrong. Please try again.';
+        } finally {
+          document.getElementById('loader').style.display = 'none';
+          input.disabled = button.disabled = false;
+          input.focus();
+        }
+      });
+    })();
+  </script>
 </body>
 </html>
 """
 
+# Compiled once; Flask's environment autoescapes string templates.
+chat_template = app.jinja_env.from_string(CHATBOT_TEMPLATE)
+
+
+def render_chat(conversation: Conversation) -> str:
+    """Chat page for *conversation*, re-rendered only after it has changed."""
+    version = conversation.version
+    rendered = conversation.rendered
+    if rendered is None or rendered[0] != version:
+        # list() snapshots the deque atomically, so a turn being recorded
+        # concurrently cannot break the iteration.
+        html = chat_template.render(conversation=list(conversation.history))
+        conversation.rendered = rendered = (version, html)
+    return rendered[1]
+
 # ---------------------------------------------------------------------------
 #  Flask routes
 # ---------------------------------------------------------------------------
 
+def session_id() -> str:
+    """Stable per-visitor id, stored in Flask's signed session cookie."""
+    sid = session.get("sid")
+    if sid is None:
+        sid = session["sid"] = uuid4().hex
+    return sid
+
+
 @app.route("/chat", methods=["GET", "POST"])
 def chat():
+    conversation = get_conversation(session_id())
     if request.method == "POST":
         user_q = request.form.get("question", "").strip()
         if user_q:
-            get_chatbot_response(user_q)
+            get_chatbot_response(conversation, user_q)
         return redirect(url_for("chat"))
-    return render_template_string(CHATBOT_TEMPLATE, conversation=conversation_history)
-
-
-@app.route("/")
-def home():
-    """Serve the public website root - index.html is located in the same directory."""
-    return send_from_directory(app.static_folder, "index.html")
+    return render_chat(conversation)
+
+
+@app.route("/chat/stream", methods=["POST"])
+def chat_stream():
+    """Stream the assistant reply as plain text for the in-page chat form."""
+    user_q = request.form.get("question", "").strip()
+    if not user_q:
+        return Response(status=204)
+    conversation = get_conversation(session_id())
+    return Response(
+        stream_with_context(stream_chatbot_response(conversation, user_q)),
+        mimetype="text/plain",
+        headers={"X-Chat-Time": current_time(), "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/reset")
 def reset():
     """Clear conversation history and redirect back to /chat."""
-    global conversation_history
-    conversation_history = [
-        {
-            "role": "assistant",
-            "content": "Hello! How can I assist you today?",
-            "timestamp": current_time(),
-        }
-    ]
+    drop_conversation(session_id())
     return redirect(url_for("chat"))
 
 
@@ -252,5 +905,6 @@ def allow_iframe(resp):
 #  Entry‑point
 # ---------------------------------------------------------------------------
 
+# Local development only – production runs under gunicorn (gunicorn.conf.py).
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5000)), debug=True)
@@ -0,0 +1,23 @@
+"""Gunicorn settings for the Gradient M chatbot
+=============================================
+Picked up automatically when gunicorn is started from this directory:
+
+    gunicorn chat_bot_app:app
+
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Conversations and response caches live in process memory, so a single
+# worker process keeps each visitor's chat in one place; threads provide the
+# concurrency while requests wait on Azure. Raise WEB_CONCURRENCY only
+# behind session-affine (sticky) routing.
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
+
+# Import the app (Azure clients, compiled template, caches) once in the
+# master so workers share it copy-on-write after fork.
+preload_app = True
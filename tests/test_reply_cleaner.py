@@ -0,0 +1,39 @@
+import os
+import random
+import tempfile
+
+for name, value in {
+    "AZURE_OPENAI_API_KEY": "test",
+    "SEARCH_KEY": "test",
+    "ENDPOINT_URL": "https://example.openai.azure.com/",
+    "DEPLOYMENT_NAME": "test",
+    "SEARCH_INDEX_NAME": "test",
+    "RESPONSE_CACHE_DIR": tempfile.mkdtemp(),
+}.items():
+    os.environ.setdefault(name, value)
+
+from chat_bot_app import ReplyCleaner, clean_response  # noqa: E402
+
+PIECES = [
+    "a", "bc", "Word", " ", "  ", "\n", "\t", " ", ".", " .", ",",
+    "[doc1]", "[doc12]", "[do", "c3]", "[", "]", "[d", "oc", "7", "[[doc2]doc4]",
+]
+
+
+def stream_through_cleaner(raw, rng):
+    cleaner = ReplyCleaner()
+    out = []
+    pos = 0
+    while pos < len(raw):
+        size = rng.randint(1, 6)
+        out.append(cleaner.feed(raw[pos : pos + size]))
+        pos += size
+    out.append(cleaner.finish())
+    return "".join(out)
+
+
+def test_streamed_output_matches_clean_response():
+    rng = random.Random(0)
+    for _ in range(100_000):
+        raw = "".join(rng.choice(PIECES) for _ in range(rng.randint(0, 30)))
+        assert stream_through_cleaner(raw, rng) == clean_response(raw), raw